@@ -0,0 +1,84 @@
+import os
+import hashlib
+import pathlib
+from typing import Awaitable, Callable, Optional
+
+import diskcache
+from agno.agent import Agent
+from dotenv import load_dotenv
+
+# Read at import time, so pick up .env before the apps call load_dotenv()
+load_dotenv()
+
+# Opt-in: set MEDGUIDE_LLM_CACHE=1 to reuse responses for identical prompts
+LLM_CACHE_ENABLED = os.getenv("MEDGUIDE_LLM_CACHE", "0") == "1"
+LLM_CACHE_DIR = pathlib.Path(__file__).resolve().parent.parent / "data" / ".llm_cache"
+
+_cache: Optional[diskcache.Cache] = None
+
+
+def _get_cache() -> diskcache.Cache:
+    global _cache
+    if _cache is None:
+        _cache = diskcache.Cache(str(LLM_CACHE_DIR))
+    return _cache
+
+
+def _cache_key(agent: Agent, prompt: str) -> str:
+    # Agent name is part of the key so agents sharing a model never collide;
+    # the system prompt, instructions and model settings are too, so editing
+    # any of them never serves a reply written for the old version
+    parts = [
+        agent.name or "",
+        agent.model.id,
+        repr(agent.system_message),
+        repr(agent.description),
+        repr(agent.instructions),
+        repr(sorted(agent.model.get_request_params().items())),
+        prompt,
+    ]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def _content(resp) -> str:
+    if isinstance(resp, str):
+        return resp
+    return resp.content or ""
+
+
+async def _plain_arun(agent: Agent, prompt: str):
+    return await agent.arun(prompt)
+
+
+async def cached_arun(
+    agent: Agent,
+    prompt: str,
+    runner: Optional[Callable[[Agent, str], Awaitable]] = None,
+    validate: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """
+    Run `agent` on `prompt` and return the response text.
+
+    When MEDGUIDE_LLM_CACHE=1, responses are stored on disk keyed on
+    SHA-256 of (agent name, model id and settings, system prompt and
+    instructions, prompt) and repeated calls return
+    instantly. `runner` lets callers plug in their own rate-limited arun;
+    it may return a RunOutput or the response text itself. `validate`
+    keeps replies the caller cannot use (e.g. a batch reply that fails to
+    parse) out of the cache, so a rerun asks the model again.
+    """
+    runner = runner or _plain_arun
+
+    if not LLM_CACHE_ENABLED:
+        return _content(await runner(agent, prompt))
+
+    cache = _get_cache()
+    key = _cache_key(agent, prompt)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+
+    content = _content(await runner(agent, prompt))
+    if content and (validate is None or validate(content)):
+        cache.set(key, content)
+    return content
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Dict, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+from agno.models.openai import OpenAIChat
+
+from agents._rate_limit import BUCKET, release_loop
+
+# One connection pool per event loop, shared by every agent
+HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+
+# id(loop) -> (loop, clients). Pooled connections reference their loop, so
+# entries are removed by aclose_clients() rather than by garbage collection
+_async_clients: Dict[int, Tuple[asyncio.AbstractEventLoop, Dict[str, AsyncOpenAI]]] = {}
+
+
+async def _sync_token_bucket(response: httpx.Response) -> None:
+    # Every OpenAI response reports the remaining TPM budget, not just 429s
+    BUCKET.update_from_headers(response.headers)
+
+
+class SharedOpenAIChat(OpenAIChat):
+    """
+    OpenAIChat that reuses one AsyncOpenAI client per event loop.
+
+    Agno builds a fresh AsyncOpenAI client and httpx pool on every call,
+    so each request paid its own TCP/TLS handshake. Clients are keyed on
+    the running loop because httpx connections cannot outlive the loop
+    that opened them, and the apps call asyncio.run more than once.
+    """
+
+    def get_async_client(self) -> AsyncOpenAI:
+        params = self._get_client_params()
+        key = repr(sorted(params.items()))
+        loop = asyncio.get_running_loop()
+        entry = _async_clients.get(id(loop))
+        if entry is None or entry[0] is not loop:  # ids can be reused by a later loop
+            entry = _async_clients[id(loop)] = (loop, {})
+        clients = entry[1]
+        if key not in clients:
+            http_client = httpx.AsyncClient(limits=HTTP_LIMITS, event_hooks={"response": [_sync_token_bucket]})
+            clients[key] = AsyncOpenAI(**params, http_client=http_client)
+        return clients[key]
+
+
+async def aclose_clients() -> None:
+    """
+    Close the running loop's pooled OpenAI clients and drop its limiter state.
+
+    Await this at the end of any loop that is about to be closed (e.g. the
+    coroutine passed to asyncio.run), or its connections are never freed.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(id(loop))
+    if entry is not None and entry[0] is loop:
+        del _async_clients[id(loop)]
+        for client in entry[1].values():
+            await client.close()
+    release_loop(loop)
+
+
+SHARED_OPENAI = SharedOpenAIChat(id="gpt-4o-mini")
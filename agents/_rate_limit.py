@@ -0,0 +1,193 @@
+import os
+import time
+import asyncio
+from functools import lru_cache
+from typing import Callable, Dict, Mapping, Optional, Tuple, TypeVar
+
+import tiktoken
+from openai import APIConnectionError, APIStatusError, APITimeoutError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+from dotenv import load_dotenv
+from agno.utils.log import log_debug
+
+# Read at import time, so pick up .env before the apps call load_dotenv()
+load_dotenv()
+
+# Cap in-flight OpenAI calls so page fan-out doesn't trip 429s
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", os.getenv("MEDGUIDE_MAX_CONCURRENCY", "8")))
+
+# Tokens-per-minute budget shared by every agent call
+TPM_LIMIT = int(os.getenv("MEDGUIDE_TPM_LIMIT", "200000"))
+
+# Reply budget reserved per call when the model sets no max_tokens;
+# OpenAI counts the completion allowance against TPM as well
+OUTPUT_TOKEN_ALLOWANCE = int(os.getenv("MEDGUIDE_OUTPUT_TOKENS", "1024"))
+
+# Transient OpenAI failures worth retrying (agno chains these as __cause__)
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+MAX_ATTEMPTS = 5
+
+# asyncio primitives bind to the loop that first waits on them, and the
+# apps may run more than one loop, so keep one per loop. Entries are keyed
+# on id(loop) and dropped by release_loop(): a contended primitive holds a
+# reference to its loop, so weak keys would never be collected.
+_T = TypeVar("_T")
+_PerLoop = Dict[int, Tuple[asyncio.AbstractEventLoop, _T]]
+
+_semaphores: "_PerLoop[asyncio.Semaphore]" = {}
+
+
+def _for_running_loop(store: "_PerLoop[_T]", factory: Callable[[], _T]) -> _T:
+    loop = asyncio.get_running_loop()
+    entry = store.get(id(loop))
+    if entry is None or entry[0] is not loop:  # ids can be reused by a later loop
+        entry = store[id(loop)] = (loop, factory())
+    return entry[1]
+
+
+@lru_cache(maxsize=None)
+def _encoding(model_id: str) -> Optional[tiktoken.Encoding]:
+    # tiktoken downloads encoding files on first use; when that fails the
+    # estimate falls back to a character count instead of failing the call.
+    # The None is cached too, so the download is not retried on every call.
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_id)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"⚠️ Token encoding unavailable, estimating from characters: {e}")
+        return None
+
+
+def estimate_tokens(text: str, model_id: str = "gpt-4o-mini") -> int:
+    """Approximate prompt size in tokens for rate-limit accounting."""
+    encoding = _encoding(model_id)
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text))
+
+
+@lru_cache(maxsize=64)
+def _static_tokens(text: str, model_id: str) -> int:
+    # System prompts are identical on every call; encode each only once
+    return estimate_tokens(text, model_id)
+
+
+def request_tokens(agent, prompt: str) -> int:
+    """Tokens one agent call reserves: system message, instructions, prompt and reply allowance."""
+    model = agent.model
+    instructions = agent.instructions if isinstance(agent.instructions, list) else [agent.instructions]
+    static = [agent.system_message, agent.description, *instructions]
+    static_text = "\n".join(s for s in static if isinstance(s, str))
+    allowance = (
+        getattr(model, "max_completion_tokens", None)
+        or getattr(model, "max_tokens", None)
+        or OUTPUT_TOKEN_ALLOWANCE
+    )
+    return _static_tokens(static_text, model.id) + estimate_tokens(prompt, model.id) + allowance
+
+
+class TokenBucket:
+    """
+    Async token bucket sized to an OpenAI tokens-per-minute (TPM) budget.
+
+    Callers await acquire(n) before each request; the bucket refills at
+    tpm / 60 tokens per second and can be tightened from the
+    x-ratelimit-remaining-tokens header returned by the API.
+    """
+
+    def __init__(self, tpm: int = 200_000):
+        self.capacity = tpm
+        self.refill_rate = tpm / 60.0
+        self.tokens = float(tpm)
+        self.updated = time.monotonic()
+        self._locks: "_PerLoop[asyncio.Lock]" = {}
+
+    def _lock(self) -> asyncio.Lock:
+        return _for_running_loop(self._locks, asyncio.Lock)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    async def acquire(self, n_tokens: int) -> None:
+        # A single oversized prompt must still go through eventually
+        n_tokens = min(n_tokens, self.capacity)
+        async with self._lock():
+            while True:
+                self._refill()
+                if self.tokens >= n_tokens:
+                    self.tokens -= n_tokens
+                    return
+                await asyncio.sleep((n_tokens - self.tokens) / self.refill_rate)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Sync the local budget with what the API reports as remaining."""
+        try:
+            remaining = float(headers.get("x-ratelimit-remaining-tokens"))
+        except (TypeError, ValueError):
+            return
+        self._refill()
+        self.tokens = min(self.tokens, remaining)
+
+
+BUCKET = TokenBucket(tpm=TPM_LIMIT)
+
+
+def llm_slot() -> asyncio.Semaphore:
+    """Concurrency gate for the running event loop."""
+    return _for_running_loop(_semaphores, lambda: asyncio.Semaphore(LLM_CONCURRENCY))
+
+
+def release_loop(loop: asyncio.AbstractEventLoop) -> None:
+    """Drop the concurrency gate and bucket lock kept for `loop`; call before closing it."""
+    for store in (_semaphores, BUCKET._locks):
+        entry = store.get(id(loop))
+        if entry is not None and entry[0] is loop:
+            del store[id(loop)]
+
+
+# -------- Retry policy --------
+_backoff = wait_random_exponential(min=1, max=30)
+
+
+def _is_transient(exc: BaseException) -> bool:
+    return isinstance(exc.__cause__ or exc, RETRYABLE_ERRORS)
+
+
+def _wait_retry_after(retry_state) -> float:
+    """Honor the server's Retry-After header, else back off exponentially."""
+    exc = retry_state.outcome.exception()
+    cause = exc.__cause__ or exc
+    if isinstance(cause, APIStatusError):
+        BUCKET.update_from_headers(cause.response.headers)
+        try:
+            return min(float(cause.response.headers.get("retry-after")), 60.0)
+        except (TypeError, ValueError):
+            pass
+    return _backoff(retry_state)
+
+
+llm_retry = retry(
+    wait=_wait_retry_after,
+    stop=stop_after_attempt(MAX_ATTEMPTS),
+    retry=retry_if_exception(_is_transient),
+    reraise=True,
+)
+
+
+@llm_retry
+async def limited_arun(agent, prompt: str):
+    """Run an agent under the concurrency and TPM caps, retrying rate limits and timeouts."""
+    await BUCKET.acquire(request_tokens(agent, prompt))
+    async with llm_slot():
+        resp = await agent.arun(prompt)
+
+    # Confirms the static system prompt is hitting OpenAI's prompt cache;
+    # shown only with agno debug logging (AGNO_DEBUG=true)
+    metrics = resp.metrics
+    if metrics and metrics.cache_read_tokens:
+        log_debug(f"{agent.name}: {metrics.cache_read_tokens}/{metrics.input_tokens} prompt tokens cached")
+    return resp
@@ -1,17 +1,45 @@
 from __future__ import annotations
-from typing import Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 import os
+import asyncio
 import pathlib
+from datetime import datetime
 
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
 from agno.tools.duckduckgo import DuckDuckGoTools
 from agno.knowledge.knowledge import Knowledge
 from agno.vectordb.lancedb import LanceDb
 from agno.vectordb.search import SearchType
-from agno.knowledge.embedder.openai import OpenAIEmbedder
 from agno.knowledge.reranker.cohere import CohereReranker
+from agno.db.base import SessionType
 from agno.db.sqlite import SqliteDb
+from agno.session.summary import SessionSummary
+from sqlalchemy import event
+
+from agents._clients import SHARED_OPENAI, SharedOpenAIChat
+from agents._rate_limit import limited_arun
+from vectordb.create_vector_db import ensure_fts_index
+from vectordb.embedder import CachedOpenAIEmbedder
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """WAL + busy timeout so concurrent runs don't hit 'database is locked'."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+# Demo follow-ups ask for earlier questions "word by word", so the rolling
+# summary keeps them verbatim instead of paraphrasing.
+SESSION_SUMMARY_PROMPT = """\
+You maintain the running summary of a conversation between a user and MedGuide, a lab-report assistant.
+You will receive the previous summary (possibly empty) and the latest question and answer.
+Return only the updated summary, in under 200 tokens of plain text:
+- First list every question the user asked, in order, quoted word for word, ending with the latest one.
+- Then add the key lab findings and answers given, one short line each.
+"""
 
 
 def chat_agent(
@@ -20,12 +48,17 @@ def chat_agent(
     top_k: int = 5,
     min_docs_for_confident_answer: int = 1,
     use_reranker: bool = True,
+    rerank_model: str = "rerank-english-v3.0",  # reports are English; lighter than multilingual
     db_path: str = "data/agent_memory.db",
     enable_agentic_memory: bool = False,
+    search_type: SearchType = SearchType.hybrid,
 ) -> Agent:
     """
     MedGuide conversational agent using LanceDB for vector search
     and DuckDuckGo for fallback web retrieval.
+
+    With use_reranker=False, hybrid results are ranked by LanceDB's
+    built-in reciprocal-rank fusion only, skipping the Cohere round trip.
     """
     if not os.getenv("OPENAI_API_KEY"):
         raise RuntimeError("❌ OPENAI_API_KEY not set.")
@@ -38,20 +71,29 @@ def chat_agent(
 
     # --- Memory DB for chat history ---
     db = SqliteDb(db_file=db_path)
+    event.listen(db.db_engine, "connect", _apply_sqlite_pragmas)  # every pooled connection
 
     # --- Vector knowledge base (LanceDB) ---
-    knowledge = Knowledge(
-        vector_db=LanceDb(
-            table_name=collection,              # CHANGED: was `collection`
-            uri=lancedb_path,                   # CHANGED: was `path`
-            search_type=SearchType.hybrid,      # NEW: enable hybrid retrieval
-            embedder=OpenAIEmbedder(id="text-embedding-3-small"),
-            reranker=CohereReranker(model="rerank-multilingual-v3.0") if use_reranker else None,
-        )
+    vector_db = LanceDb(
+        table_name=collection,              # CHANGED: was `collection`
+        uri=lancedb_path,                   # CHANGED: was `path`
+        search_type=search_type,            # hybrid: LanceDB fuses BM25 + vector with RRF
+        embedder=CachedOpenAIEmbedder(       # repeat queries skip the embedding call
+            id="text-embedding-3-small",
+            enable_batch=True,              # document inserts embed 256 chunks per request
+            batch_size=256,
+            cache_dir=str(pathlib.Path(lancedb_path).parent / ".embedding_cache"),
+        ),
+        reranker=CohereReranker(model=rerank_model) if use_reranker else None,
+        use_tantivy=False,                  # reuse the native FTS index built at ingest
     )
+    # Without a BM25 index the keyword half of hybrid search has nothing to hit
+    if search_type != SearchType.vector:
+        ensure_fts_index(vector_db)
+    knowledge = Knowledge(vector_db=vector_db)
 
     # --- Model + tools ---
-    model = OpenAIChat(id="gpt-4o-mini")
+    model = SHARED_OPENAI
     web_tool = DuckDuckGoTools(enable_search=True)
 
     # --- Agent setup ---
@@ -71,32 +113,118 @@ def chat_agent(
         enable_user_memories=not enable_agentic_memory,
         enable_agentic_memory=enable_agentic_memory,
         add_history_to_context=True,
-        num_history_runs=3,
+        num_history_runs=1,                 # older turns live in the running summary below
         read_chat_history=True,
     )
 
+    # Agno's summarizer re-reads the whole transcript inline after every
+    # run; fold only the latest question/answer pair in, in the background
+    summarizer = Agent(
+        name="session_summarizer",
+        model=SharedOpenAIChat(id="gpt-4o-mini"),
+        system_message=SESSION_SUMMARY_PROMPT,
+        markdown=False,
+    )
+    # session_id -> in-flight summary update
+    pending: Dict[str, asyncio.Task] = {}
+
     # --- Helper ---
     def _text(o) -> str:
         return getattr(o, "content", str(o)) or ""
 
-    # --- Custom answer pipeline ---
-    def answer(
-        query: str,
-        *,
-        user_id: Optional[str] = None,
-        session_id: Optional[str] = None,
-    ) -> Tuple[str, int]:
+    # The summary lives on the agno session row, so it survives agent
+    # rebuilds and restarts like the rest of the chat history
+    def _stored_summary(session_id: str) -> str:
+        session = db.get_session(session_id=session_id, session_type=SessionType.AGENT)
+        summary = session.summary if session is not None else None
+        return summary.summary if summary is not None else ""
+
+    def _store_summary(session_id: str, text: str) -> None:
+        session = db.get_session(session_id=session_id, session_type=SessionType.AGENT)
+        if session is None:
+            return
+        session.summary = SessionSummary(summary=text, updated_at=datetime.now())
+        db.upsert_session(session)
+
+    async def _update_summary(session_id: str, query: str, reply: str) -> None:
         try:
-            retrieved = knowledge.vector_db.search(query=query) or []
+            previous = await asyncio.to_thread(_stored_summary, session_id)
+            prompt = (
+                f"Previous summary:\n{previous or '(none)'}\n\n"
+                f"Latest question:\n{query}\n\nLatest answer:\n{reply}"
+            )
+            text = _text(await limited_arun(summarizer, prompt)).strip()
+            if text:
+                await asyncio.to_thread(_store_summary, session_id, text)
+        except Exception as e:
+            print(f"⚠️ Session summary update failed: {e}")
+
+    async def _session_summary(session_id: Optional[str]) -> str:
+        if session_id is None:
+            return ""
+        # Normally finished while the user reads the answer; only waits when
+        # the next question arrives first. It must also land before the next
+        # run, which re-saves the whole session row.
+        update = pending.get(session_id)
+        if update is not None and update.get_loop() is asyncio.get_running_loop():
+            await asyncio.wait([update])
+        try:
+            return await asyncio.to_thread(_stored_summary, session_id)
+        except Exception:
+            return ""  # first turn: session not created yet
+
+    def _remember_turn(session_id: Optional[str], query: str, reply: str) -> None:
+        if session_id is None or not reply:
+            return
+        update = asyncio.create_task(_update_summary(session_id, query, reply))
+        pending[session_id] = update
+        update.add_done_callback(lambda t: pending.pop(session_id, None) if pending.get(session_id) is t else None)
+
+    search_fn = {
+        SearchType.vector: vector_db.vector_search,
+        SearchType.keyword: vector_db.keyword_search,
+    }.get(search_type, vector_db.hybrid_search)
+
+    def _search(query: str) -> List:
+        # LanceDb.search() reopens the table on every call; reuse the handle
+        # opened at construction instead. The KB is built before the agent,
+        # so the cached handle already sees the ingested rows.
+        results = search_fn(query, limit=top_k)
+        if results is None or len(results) == 0:
+            return []
+        docs = vector_db._build_search_results(results)
+        if vector_db.reranker is not None and docs:
+            docs = vector_db.reranker.rerank(query=query, documents=docs)
+        return docs
+
+    # --- Retrieval (stateless, safe to run concurrently) ---
+    async def retrieve(query: str) -> List:
+        try:
+            # LanceDB search + query embedding are blocking; keep them off the event loop
+            retrieved = await asyncio.to_thread(_search, query) or []
         except IndexError:
             print("⚠️ Empty LanceDB search result. Returning [].")
             retrieved = []
         except Exception as e:
             print(f"⚠️ LanceDB search failed: {e}")
             retrieved = []
-        retrieved = retrieved[:top_k]
+        return retrieved[:top_k]
+
+    # --- Custom answer pipeline ---
+    async def answer(
+        query: str,
+        *,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        retrieved: Optional[List] = None,
+    ) -> Tuple[str, int]:
+        if retrieved is None:
+            retrieved = await retrieve(query)
         count = len(retrieved)
 
+        summary = await _session_summary(session_id)
+        history = f"Summary of earlier conversation:\n{summary}\n\n" if summary else ""
+
         def _doc_text(d):
             return (
                 getattr(d, "text", None)
@@ -125,7 +253,8 @@ def chat_agent(
                 - Cite which snippets you relied on
                 - Do not diagnose or prescribe
                 """
-            out = agent.run(prompt, user_id=user_id, session_id=session_id)
+            out = await agent.arun(history + prompt, user_id=user_id, session_id=session_id)
+            _remember_turn(session_id, query, _text(out))
             return _text(out), count
 
         prompt = f"""
@@ -142,10 +271,12 @@ def chat_agent(
 
             Provide a clear, factual, and concise answer based on the above.
             """
-        out = agent.run(prompt, user_id=user_id, session_id=session_id)
+        out = await agent.arun(history + prompt, user_id=user_id, session_id=session_id)
+        _remember_turn(session_id, query, _text(out))
         return _text(out), count
 
 
+    agent.retrieve = retrieve
     agent.answer = answer
     return agent
 
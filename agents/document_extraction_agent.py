@@ -1,9 +1,10 @@
 from agno.agent import Agent
-from agno.models.openai import OpenAIChat
+
+from agents._clients import SHARED_OPENAI
 
 document_extraction_agent = Agent(
     name="Blood Report Page Extractor",
-    model=OpenAIChat(id="gpt-4o-mini"),
+    model=SHARED_OPENAI,
     description=(
         "Extract visible test names, results, and reference ranges from a single lab report page. "
         "Focus on clarity and precision, without interpretation or analysis."
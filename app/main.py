@@ -3,12 +3,19 @@ import os
 import json
 import asyncio
 import shutil
+import uuid
+import threading
+import aiofiles
 from pathlib import Path
 from dotenv import load_dotenv
 from time import perf_counter
+from agno.run.agent import RunEvent
 
-from utils.pdf_extractor import extract_text_from_pdf
-from agents.document_extraction_agent import document_extraction_agent
+from utils.pdf_extractor import extract_pages_parallel, strip_repeated_lines
+from utils.batching import chunked, fill_missing, parse_page_outputs, run_page_batch
+from agents._rate_limit import BUCKET, limited_arun, llm_retry, llm_slot, request_tokens
+from agents._cache import cached_arun
+from agents._clients import aclose_clients
 from agents.analyzer_agent import analyzer_agent
 from agents.final_report_agent import final_report_agent
 from vectordb.create_vector_db import create_vectordb_from_pdfs_and_outputs
@@ -19,72 +26,124 @@ from agents.chat_agent import chat_agent
 load_dotenv()
 PARALLEL_TIMEOUT = 200
 
+# Pages packed into one analysis call (1 = one call per page)
+BATCH_PAGES = int(os.getenv("MEDGUIDE_BATCH_PAGES", "4"))
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 OUTPUT_DIR = BASE_DIR / "data" / "knowledge_base" / "outputs"
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-# 🧹 Clean up existing files before every run
-if any(OUTPUT_DIR.iterdir()):
-    print(f"🧹 Cleaning up old files in {OUTPUT_DIR}...")
-    shutil.rmtree(OUTPUT_DIR)
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-# -------- Async Step 1: Page Extraction --------
-async def extract_page_async(page_text: str, page_number: int):
-    """Run the document extraction agent for a single page."""
-    try:
-        prompt = (
-            f"Page {page_number} of a blood test report.\n"
-            f"Extract all test names, values, and reference ranges as JSON."
-        )
-        resp = await document_extraction_agent.arun(f"{prompt}\n\n{page_text[:15000]}")
-        return resp.content
-    except Exception as e:
-        print(f"⚠️ Page {page_number} extraction failed: {e}")
-        return None
 
+def _discard_dir(path: Path) -> None:
+    """
+    Move a directory aside and delete it in a background thread.
 
+    The rename is a single syscall, so callers can recreate `path` at once
+    while the recursive delete runs off the critical path. Leftovers from
+    runs that exited before their delete finished are swept here too.
+    """
+    for stale in path.parent.glob(f"{path.name}.old-*"):
+        threading.Thread(target=shutil.rmtree, args=(stale,), kwargs={"ignore_errors": True}, daemon=True).start()
+
+    if not path.exists():
+        return
+    trash = path.with_name(f"{path.name}.old-{uuid.uuid4().hex[:8]}")
+    path.rename(trash)
+    threading.Thread(target=shutil.rmtree, args=(trash,), kwargs={"ignore_errors": True}, daemon=True).start()
+
+
+# -------- Streaming Helper --------
+@llm_retry
+async def _astream_to_file(agent, prompt: str, path: Path) -> str:
+    """Like limited_arun, but streams content deltas into `path` as they arrive."""
+    await BUCKET.acquire(request_tokens(agent, prompt))
+    async with llm_slot():
+        chunks = []
+        async with aiofiles.open(path, "w", encoding="utf-8") as f:
+            async for event in agent.arun(prompt, stream=True):
+                if event.event == RunEvent.run_error.value:
+                    raise RuntimeError(event.content)
+                if event.event == RunEvent.run_content.value and event.content:
+                    chunks.append(event.content)
+                    await f.write(event.content)
+        return "".join(chunks)
+
+
+# -------- Async Step 1: Page Text Extraction --------
 async def extract_blood_report_async(pdf_path: str):
-    """Extract text page-wise and run extraction agents concurrently."""
+    """Extract cleaned text page-wise; the analyzer reads it directly."""
     pdf_file_path = Path(pdf_path)
     if not pdf_file_path.exists():
         raise FileNotFoundError(f"PDF not found: {pdf_path}")
 
     print(f"📄 Extracting text per page from PDF: {pdf_path}")
-    pages = extract_text_from_pdf(pdf_path, by_page=True)
+    # PyMuPDF parsing is CPU-bound: page ranges go to a process pool that
+    # extract_pages_parallel starts (and shuts down) only for this call
+    pages = await asyncio.to_thread(extract_pages_parallel, pdf_path)
     print(f"✅ Extracted {len(pages)} pages")
 
-    # Run all page extractions in parallel
-    tasks = [extract_page_async(p, i + 1) for i, p in enumerate(pages)]
-    results = await asyncio.gather(*tasks)
-    return [r for r in results if r]
+    # Drop headers/footers repeated on every page before they reach the model
+    raw_chars = sum(len(p) for p in pages)
+    pages = strip_repeated_lines(pages)
+    print(f"🧹 Stripped {raw_chars - sum(len(p) for p in pages)} chars of repeated boilerplate")
+    return pages
 
 
 # -------- Async Step 2: Page Analysis (Parallel) --------
+async def _save_page_output(page_number: int, output_text: str) -> Path:
+    page_file = OUTPUT_DIR / f"page_{page_number}.txt"
+    async with aiofiles.open(page_file, "w", encoding="utf-8") as f:
+        await f.write(output_text)
+    print(f"✅ Saved page {page_number} analysis → {page_file}")
+    return page_file
+
+
 async def analyze_page_async(page_text: str, page_number: int):
     """Run the combined page analysis agent for a single page."""
+    page_file = OUTPUT_DIR / f"page_{page_number}.txt"
     try:
         prompt = f"Analyze Page {page_number} of the blood report:\n{page_text[:15000]}"
-        resp = await analyzer_agent.arun(prompt)
-        output_text = resp.content.strip()
 
-        # Save individual page output
-        page_file = OUTPUT_DIR / f"page_{page_number}.txt"
-        page_file.write_text(output_text, encoding="utf-8")
-
-        print(f"✅ Saved page {page_number} analysis → {page_file}")
+        # Stream straight into the page file; cache hits still need writing
+        output_text = (await cached_arun(
+            analyzer_agent, prompt, runner=lambda agent, p: _astream_to_file(agent, p, page_file)
+        )).strip()
+        if page_file.exists():
+            print(f"✅ Saved page {page_number} analysis → {page_file}")
+        else:
+            await _save_page_output(page_number, output_text)
         return output_text
 
     except Exception as e:
+        page_file.unlink(missing_ok=True)  # drop any half-streamed output
         print(f"⚠️ Page {page_number} analysis failed: {e}")
         return f"[Page {page_number}] Analysis failed."
 
 
+async def analyze_batch_async(page_texts: list[str], first_page: int):
+    """Run the page analysis agent once for a batch of pages."""
+    outputs = await run_page_batch(
+        lambda prompt: cached_arun(
+            analyzer_agent,
+            prompt,
+            runner=limited_arun,
+            validate=lambda text: all(parse_page_outputs(text, len(page_texts))),
+        ),
+        "Analyze each of the following pages of the blood report.",
+        page_texts,
+        first_page,
+    )
+    await asyncio.gather(*(
+        _save_page_output(first_page + i, output_text)
+        for i, output_text in enumerate(outputs) if output_text
+    ))
+    return await fill_missing(outputs, page_texts, first_page, analyze_page_async)
+
+
 async def run_parallel_analysis(page_texts: list[str]):
     """Run the analyzer+risk logic in parallel for all pages."""
     print("🚀 Running page-wise analysis in parallel...")
-    tasks = [analyze_page_async(t, i + 1) for i, t in enumerate(page_texts)]
-    results = await asyncio.gather(*tasks)
+    tasks = [analyze_batch_async(batch, start + 1) for start, batch in chunked(page_texts, BATCH_PAGES)]
+    results = [r for batch in await asyncio.gather(*tasks) for r in batch]
     print(f"✅ Completed {len(results)} page analyses")
     return results
 
@@ -105,12 +164,12 @@ async def generate_final_report(page_outputs: list[str]):
         )
 
         print("🧩 Synthesizing final report...")
-        resp = await final_report_agent.arun(prompt)
-        final_text = resp.content.strip()
+        final_text = (await cached_arun(final_report_agent, prompt, runner=limited_arun)).strip()
 
         # Save the combined final report
         final_path = OUTPUT_DIR / "final_report.txt"
-        final_path.write_text(final_text, encoding="utf-8")
+        async with aiofiles.open(final_path, "w", encoding="utf-8") as f:
+            await f.write(final_text)
         print(f"💾 Final report saved → {final_path}")
 
         return final_text
@@ -127,9 +186,13 @@ def always_clear_memory(db_path: str):
     try:
         if os.path.exists(db_path):
             if os.path.isdir(db_path):
-                shutil.rmtree(db_path)
+                _discard_dir(Path(db_path))
             else:
                 os.remove(db_path)
+                # SQLite WAL sidecar files
+                for suffix in ("-wal", "-shm"):
+                    if os.path.exists(db_path + suffix):
+                        os.remove(db_path + suffix)
             print(f"🧹 Automatically cleared memory at: {db_path}")
     except Exception as e:
         print(f"⚠️ Could not clear memory: {e}")
@@ -138,7 +201,7 @@ def always_clear_memory(db_path: str):
 async def run_pipeline(pdf_path: str):
     start = perf_counter()
 
-    # 1️⃣ Extract Text & Basic Data
+    # 1️⃣ Extract Page Text (analyzer handles test extraction itself)
     pages = await extract_blood_report_async(pdf_path)
 
     # 2️⃣ Analyze Each Page in Parallel
@@ -155,13 +218,31 @@ async def run_pipeline(pdf_path: str):
     print(f"\n⏱️ Total Time: {perf_counter() - start:.1f}s")
 
 
+async def _run_and_close(coro):
+    """Run `coro`, let background work (session summaries) finish, then free the loop's clients."""
+    try:
+        return await coro
+    finally:
+        others = asyncio.all_tasks() - {asyncio.current_task()}
+        if others:
+            await asyncio.wait(others)
+        await aclose_clients()
+
+
 # -------- Entry Point --------
 if __name__ == "__main__":
+    # 🧹 Clean up existing files before every run. Kept under the guard:
+    # spawn-started pool workers re-import this module and must not run it.
+    if OUTPUT_DIR.exists() and any(OUTPUT_DIR.iterdir()):
+        print(f"🧹 Cleaning up old files in {OUTPUT_DIR}...")
+        _discard_dir(OUTPUT_DIR)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     pdf_path = os.path.join(BASE_DIR, "data", "sample_reports", "labreportnew.pdf")
 
     try:
-        asyncio.run(run_pipeline(pdf_path))
+        asyncio.run(_run_and_close(run_pipeline(pdf_path)))
     except Exception as e:
         print(f"❌ Error: {e}")
 
@@ -191,13 +272,22 @@ if __name__ == "__main__":
         "what was the question that i asked previously, just give me the question word by word."
     ]
 
-    for q in queries:
-        answer_text, retrieved_count = agent.answer(
-            q,
-            user_id="user-123",
-            session_id="medguide-session-1",
-        )
-
-        print(f"\n📄 Retrieved docs: {retrieved_count}")
-        print(f"\n🧠 Final Answer:\n{answer_text}")
-    
\ No newline at end of file
+    async def run_queries():
+        # Retrieval has no session state, so every query's search runs at once
+        retrieved = await asyncio.gather(*(agent.retrieve(q) for q in queries))
+
+        # The LLM turns stay in order: the last two questions ask about the
+        # earlier ones, and agno saves the whole session after each run, so
+        # concurrent turns in one session would overwrite each other's history
+        for q, docs in zip(queries, retrieved):
+            answer_text, retrieved_count = await agent.answer(
+                q,
+                user_id="user-123",
+                session_id="medguide-session-1",
+                retrieved=docs,
+            )
+
+            print(f"\n📄 Retrieved docs: {retrieved_count}")
+            print(f"\n🧠 Final Answer:\n{answer_text}")
+
+    asyncio.run(_run_and_close(run_queries()))
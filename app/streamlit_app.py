@@ -1,25 +1,31 @@
 import os
 import io
 import sys
-import base64
+import json
+import shutil
+import uuid
+import hashlib
 import asyncio
 import pathlib
+import threading
 from time import perf_counter
-from typing import List
-import time
+from typing import List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
 import streamlit as st
 from dotenv import load_dotenv
 
 # --- Local imports ---
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from utils.pdf_extractor import extract_text_from_pdf
+from utils.pdf_extractor import extract_pages_parallel
+from utils.batching import chunked, contiguous_runs, fill_missing, run_page_batch
 from agents.document_extraction_agent import document_extraction_agent
 from agents.analyzer_agent import analyzer_agent
 from agents.final_report_agent import final_report_agent
-from vectordb.create_vector_db import create_vectordb_from_pdfs_and_outputs
+from vectordb.create_vector_db import MANIFEST_NAME, create_vectordb_from_pdfs_and_outputs
 from agno.vectordb.search import SearchType
 from agents.chat_agent import chat_agent
-from agno.models.openai import OpenAIChat
+from agents._clients import SharedOpenAIChat
+from agents._rate_limit import limited_arun
 
 # ---------- Load env ----------
 load_dotenv()
@@ -32,8 +38,12 @@ DATA_DIR = BASE_DIR / "data"
 OUTPUT_DIR = DATA_DIR / "knowledge_base" / "outputs"
 UPLOAD_DIR = DATA_DIR / "uploads"
 LANCEDB_DIR = DATA_DIR / "lancedb"
+CACHE_DIR = DATA_DIR / "cache"  # per-upload artifacts, keyed on SHA-256 of the PDF bytes
 TABLE_NAME = "medguide_collection"
 
+# Pages packed into one extraction/analysis call (1 = one call per page)
+BATCH_PAGES = int(os.getenv("MEDGUIDE_BATCH_PAGES", "5"))
+
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 LANCEDB_DIR.mkdir(parents=True, exist_ok=True)
@@ -51,10 +61,77 @@ for k, v in defaults.items():
     st.session_state.setdefault(k, v)
 
 # ---------- Helpers ----------
+@st.cache_resource
+def _event_loop() -> asyncio.AbstractEventLoop:
+    # One loop for the whole server, running in a daemon thread. The pooled
+    # OpenAI clients and limiter state cached per loop then exist once
+    # instead of once per browser session, and nothing is left behind when
+    # a session ends. Background tasks (chat summaries) keep running too.
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="medguide-event-loop", daemon=True).start()
+    return loop
+
+
+def run_async(coro):
+    """Run `coro` on the server's shared event loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop()).result()
+
+
+@st.cache_resource
+def _pdf_pool() -> ProcessPoolExecutor:
+    # One pool per server process; the script body reruns on every interaction
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+
+
+# Only the current KB/config is ever used; an older entry would keep its
+# LanceDB table, SQLite engine and embedding cache open after a rebuild
+@st.cache_resource(max_entries=1)
+def get_chat_agent(
+    lancedb_path: str,
+    collection: str,
+    use_reranker: bool,
+    rerank_model: str,
+    model_id: str,
+    db_path: str,
+    search_type: SearchType,
+    kb_version: int,
+):
+    """
+    Build the chat agent once per configuration and share it across reruns.
+
+    `kb_version` is the LanceDB manifest's mtime: the agent holds an open
+    table handle, so a KB rebuild must produce a fresh agent.
+
+    The agent is shared by every browser session on this server, so
+    callers keep conversations apart with their own session_id.
+    """
+    ag = chat_agent(
+        lancedb_path=lancedb_path,
+        collection=collection,
+        top_k=5,
+        min_docs_for_confident_answer=1,
+        use_reranker=use_reranker,
+        rerank_model=rerank_model,
+        db_path=db_path,
+        enable_agentic_memory=False,
+        search_type=search_type,
+    )
+    try:
+        ag.model = SharedOpenAIChat(id=model_id)
+    except Exception:
+        pass
+    return ag
+
+
+@st.cache_data(show_spinner=False)
+def _load_page_text(path_str: str, mtime: float) -> str:
+    # mtime is part of the cache key, so a rewritten page is read again
+    return pathlib.Path(path_str).read_text(encoding="utf-8")
+
+
 def save_uploaded_file(uploaded_file, dest_dir: pathlib.Path) -> pathlib.Path:
     dest = dest_dir / uploaded_file.name
-    with open(dest, "wb") as f:
-        f.write(uploaded_file.read())
+    dest.write_bytes(uploaded_file.getbuffer())  # memoryview: no extra copy of the PDF
     return dest
 
 
@@ -62,9 +139,9 @@ async def extract_page_async(page_text: str, page_number: int):
     try:
         prompt = (
             f"Page {page_number} of a blood test report.\n"
-            f"Extract all test names, values, and reference ranges as JSON."
+            f"Extract all test names, values, and reference ranges."
         )
-        resp = await document_extraction_agent.arun(f"{prompt}\n\n{page_text[:15000]}")
+        resp = await limited_arun(document_extraction_agent, f"{prompt}\n\n{page_text[:15000]}")
         return resp.content
     except Exception:
         return None
@@ -73,7 +150,7 @@ async def extract_page_async(page_text: str, page_number: int):
 async def analyze_page_async(page_text: str, page_number: int, out_dir: pathlib.Path):
     try:
         prompt = f"Analyze Page {page_number} of the blood report:\n{page_text[:15000]}"
-        resp = await analyzer_agent.arun(prompt)
+        resp = await limited_arun(analyzer_agent, prompt)
         output_text = (resp.content or "").strip()
         (out_dir / f"page_{page_number}.txt").write_text(output_text, encoding="utf-8")
         return output_text
@@ -81,16 +158,131 @@ async def analyze_page_async(page_text: str, page_number: int, out_dir: pathlib.
         return f"[Page {page_number}] Analysis failed."
 
 
-async def run_page_extraction(pdf_path: pathlib.Path) -> List[str]:
-    pages = extract_text_from_pdf(str(pdf_path), by_page=True)
-    tasks = [extract_page_async(p, i + 1) for i, p in enumerate(pages)]
-    results = await asyncio.gather(*tasks)
-    return [r for r in results if r]
+async def _agent_text(agent, prompt: str) -> str:
+    resp = await limited_arun(agent, prompt)
+    return resp.content or ""
+
+
+async def _extract_batch(pages: List[str], first_page: int) -> List[Optional[str]]:
+    outputs = await run_page_batch(
+        lambda prompt: _agent_text(document_extraction_agent, prompt),
+        "Each page is from a blood test report. Extract all test names, values, and reference ranges.",
+        pages,
+        first_page,
+    )
+    return await fill_missing(outputs, pages, first_page, extract_page_async)
+
+
+async def _analyze_batch(pages: List[str], first_page: int, out_dir: pathlib.Path) -> List[Optional[str]]:
+    outputs = await run_page_batch(
+        lambda prompt: _agent_text(analyzer_agent, prompt),
+        "Analyze each of the following pages of the blood report.",
+        pages,
+        first_page,
+    )
+    for i, output_text in enumerate(outputs):
+        if output_text:
+            (out_dir / f"page_{first_page + i}.txt").write_text(output_text, encoding="utf-8")
+    return await fill_missing(
+        outputs, pages, first_page, lambda text, page_number: analyze_page_async(text, page_number, out_dir)
+    )
 
 
-async def run_page_analysis(page_texts: List[str], out_dir: pathlib.Path) -> List[str]:
-    tasks = [analyze_page_async(t, i + 1, out_dir) for i, t in enumerate(page_texts)]
-    return await asyncio.gather(*tasks)
+async def _extract_and_analyze(
+    pdf_path: pathlib.Path,
+    pdf_data: memoryview,
+    out_dir: pathlib.Path,
+    pages_file: pathlib.Path,
+) -> Tuple[List[dict], bool]:
+    """
+    Run extraction and analysis, handing each extraction batch to analysis
+    as soon as it completes so the two stages overlap.
+
+    Returns the analyzed pages and whether every page was extracted; pages
+    whose extraction failed are missing from the list.
+    """
+    async def extract_group(group: List[str], first_page: int):
+        return first_page, await _extract_batch(group, first_page)
+
+    async def analyze_group(group: List[str], first_page: int):
+        return first_page, await _analyze_batch(group, first_page, out_dir)
+
+    if pages_file.exists():
+        extracted = json.loads(pages_file.read_text(encoding="utf-8"))
+        analysis = [
+            asyncio.create_task(analyze_group(batch, run_start + offset))
+            for run_start, group in contiguous_runs(extracted, 1)
+            for offset, batch in chunked(group, BATCH_PAGES)
+        ]
+    else:
+        # PyMuPDF parsing is CPU-bound: fan it out to processes, off the event loop.
+        # Workers get the saved path; small reports are parsed from the upload buffer.
+        pages = await asyncio.to_thread(extract_pages_parallel, pdf_path, executor=_pdf_pool(), data=pdf_data)
+        extraction = [extract_group(group, start + 1) for start, group in chunked(pages, BATCH_PAGES)]
+        extracted: List[Optional[str]] = [None] * len(pages)
+        analysis = []
+        for done in asyncio.as_completed(extraction):
+            first_page, results = await done
+            extracted[first_page - 1:first_page - 1 + len(results)] = results
+            analysis += [
+                asyncio.create_task(analyze_group(group, run_start))
+                for run_start, group in contiguous_runs(results, first_page)
+            ]
+        if all(extracted):  # never cache a failed page
+            pages_file.write_text(json.dumps(extracted), encoding="utf-8")
+
+    analyzed = sorted(await asyncio.gather(*analysis), key=lambda item: item[0])
+    items = [
+        {"page": first_page + i, "output": output}
+        for first_page, outputs in analyzed
+        for i, output in enumerate(outputs)
+    ]
+    return items, all(extracted)
+
+
+async def run_full_pipeline(
+    pdf_path: pathlib.Path,
+    pdf_data: memoryview,
+    out_dir: pathlib.Path,
+    cache_dir: pathlib.Path,
+) -> str:
+    """
+    Extract, analyze and summarize a report inside one event loop.
+
+    Stage results are stored under `cache_dir` (one directory per PDF
+    digest); stages already cached there are loaded instead of re-run,
+    so a repeated upload makes no LLM calls at all.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    pages_file = cache_dir / "pages.json"
+    outputs_file = cache_dir / "page_outputs.json"
+    final_file = cache_dir / "final_report.txt"
+
+    if outputs_file.exists():
+        analyzed = json.loads(outputs_file.read_text(encoding="utf-8"))
+        for item in analyzed:
+            (out_dir / f"page_{item['page']}.txt").write_text(item["output"], encoding="utf-8")
+        complete = True
+    else:
+        # A cached report without cached page outputs was built from failed pages
+        final_file.unlink(missing_ok=True)
+        analyzed, all_extracted = await _extract_and_analyze(pdf_path, pdf_data, out_dir, pages_file)
+        # Pages that failed extraction are missing, and analyze_page_async's
+        # failure placeholder must not be cached either
+        complete = all_extracted and not any(
+            item["output"] == f"[Page {item['page']}] Analysis failed." for item in analyzed
+        )
+        if complete:
+            outputs_file.write_text(json.dumps(analyzed), encoding="utf-8")
+
+    if final_file.exists():
+        final_text = final_file.read_text(encoding="utf-8")
+        (out_dir / "final_report.txt").write_text(final_text, encoding="utf-8")
+    else:
+        final_text = await generate_final_report([item["output"] for item in analyzed], out_dir)
+        if final_text and complete:
+            final_file.write_text(final_text, encoding="utf-8")
+    return final_text
 
 
 async def generate_final_report(page_outputs: List[str], out_dir: pathlib.Path) -> str:
@@ -104,39 +296,28 @@ async def generate_final_report(page_outputs: List[str], out_dir: pathlib.Path)
         "Keep the tone factual, safe, and supportive. Avoid diagnosis or prescriptions.\n\n"
         f"{merged}"
     )
-    resp = await final_report_agent.arun(prompt)
+    resp = await limited_arun(final_report_agent, prompt)
     final_text = (resp.content or "").strip()
     (out_dir / "final_report.txt").write_text(final_text, encoding="utf-8")
     return final_text
 
 
-def make_data_link(label: str, text: str, filename: str) -> str:
-    b64 = base64.b64encode(text.encode("utf-8")).decode("utf-8")
-    return f'<a href="data:text/plain;base64,{b64}" download="{filename}" target="_blank">{label}</a>'
-
-
-async def stream_markdown_smooth(text: str, delay: float = 0.15):
-    """Stream markdown text paragraph by paragraph for natural display."""
-    paragraphs = text.split("\n\n")
-    placeholder = st.empty()
-    streamed_text = ""
-
-    for para in paragraphs:
-        for i in range(0, len(para), 200):  # ~40–50 words per burst
-            streamed_text += para[i:i+200]
-            placeholder.markdown(streamed_text)
-            time.sleep(delay)
-        streamed_text += "\n\n"
-        placeholder.markdown(streamed_text)
-        time.sleep(0.2)
+def _chunks(text: str, size: int = 200):
+    """Yield the report paragraph by paragraph in ~40–50 word slices for st.write_stream."""
+    for para in text.split("\n\n"):
+        slices = [para[i:i + size] for i in range(0, len(para), size)] or [""]
+        # Carry the paragraph break on the last slice: one UI update less per paragraph
+        slices[-1] += "\n\n"
+        yield from slices
 
 # ---------- Sidebar ----------
 with st.sidebar:
     st.header("Configuration")
     model_id = st.text_input("Model id", value="gpt-4o-mini")
     openai_key = st.text_input("OPENAI_API_KEY", type="password")
-    enable_reranker = st.toggle("Use Cohere reranker", value=True)
+    enable_reranker = st.toggle("Use Cohere reranker", value=True, help="Off: rank with LanceDB's RRF fusion only")
     cohere_key = st.text_input("COHERE_API_KEY", type="password") if enable_reranker else ""
+    rerank_model = st.text_input("Rerank model", value="rerank-english-v3.0") if enable_reranker else ""
     hybrid = st.toggle("Hybrid retrieval (LanceDB BM25+vector)", value=True)
 
     col1, col2 = st.columns(2)
@@ -178,20 +359,15 @@ if uploaded and (process_clicked or st.session_state["processed"]):
     if process_clicked and not st.session_state["processed"]:
         start = perf_counter()
         # clear old outputs
-        for p in OUTPUT_DIR.glob("*"):
-            if p.is_file():
-                p.unlink()
-            else:
-                import shutil
-                shutil.rmtree(p)
+        shutil.rmtree(OUTPUT_DIR, ignore_errors=True)
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+        digest = hashlib.sha256(uploaded.getbuffer()).hexdigest()
         pdf_path = save_uploaded_file(uploaded, UPLOAD_DIR)
-        with st.spinner("Extracting pages..."):
-            pages = asyncio.run(run_page_extraction(pdf_path))
-        with st.spinner("Analyzing pages..."):
-            page_outputs = asyncio.run(run_page_analysis(pages, OUTPUT_DIR))
-        with st.spinner("Synthesizing final report..."):
-            final_text = asyncio.run(generate_final_report(page_outputs, OUTPUT_DIR))
+        with st.spinner("Extracting, analyzing and summarizing pages..."):
+            final_text = run_async(
+                run_full_pipeline(pdf_path, uploaded.getbuffer(), OUTPUT_DIR, CACHE_DIR / digest)
+            )
 
         st.session_state["final_text"] = final_text
         st.session_state["processed"] = True
@@ -203,10 +379,10 @@ if uploaded and (process_clicked or st.session_state["processed"]):
                 pdfs_subdir="data/knowledge_base/pdfs",
                 outputs_subdir="data/knowledge_base/outputs",
                 lancedb_subdir="data/lancedb",
-                recreate=True,
                 table_name=TABLE_NAME,
                 search_type=SearchType.hybrid if hybrid else SearchType.vector,
                 use_reranker=bool(enable_reranker and cohere_key),
+                rerank_model=rerank_model,
             )
         st.session_state["kb_ready"] = True
         st.success(f"Report processed successfully in {perf_counter() - start:.1f}s.")
@@ -215,7 +391,7 @@ if uploaded and (process_clicked or st.session_state["processed"]):
     final_text = st.session_state.get("final_text", "")
     st.subheader("Final Summary")
     if final_text and not st.session_state.get("final_displayed"):
-        asyncio.run(stream_markdown_smooth(final_text, delay=0.1))
+        st.write_stream(_chunks(final_text))
         st.session_state["final_displayed"] = True
     elif final_text:
         st.markdown(final_text)
@@ -225,36 +401,39 @@ if uploaded and (process_clicked or st.session_state["processed"]):
 
     # ---------- Page-wise summaries ----------
     st.subheader("Page Summaries")
-    page_links = []
-    for txt_file in sorted(OUTPUT_DIR.glob("page_*.txt")):
-        txt = txt_file.read_text(encoding="utf-8")
-        html = make_data_link(f"Open {txt_file.name}", txt, txt_file.name)
-        page_links.append(html)
-    if page_links:
-        st.markdown("<br>".join(page_links), unsafe_allow_html=True)
+    # Served by Streamlit's backend on click instead of inlined as base64 on every rerun
+    with os.scandir(OUTPUT_DIR) as entries:
+        page_files = sorted(
+            (e.name, e.path, e.stat().st_mtime) for e in entries
+            if e.name.startswith("page_") and e.name.endswith(".txt") and e.is_file()
+        )
+    for name, path, mtime in page_files:
+        st.download_button(
+            f"Open {name}",
+            data=_load_page_text(path, mtime),
+            file_name=name,
+            mime="text/plain",
+            key=path,
+        )
 
     # ---------- Chat Agent ----------
     if st.session_state.get("kb_ready"):
         st.subheader("💬 Chat with MedGuide")
-        if "chat_agent_obj" not in st.session_state:
-            ag = chat_agent(
-                lancedb_path=str(LANCEDB_DIR),
-                collection=TABLE_NAME,
-                top_k=5,
-                min_docs_for_confident_answer=1,
-                use_reranker=bool(enable_reranker and cohere_key),
-                db_path=str(DATA_DIR / "agent_memory.db"),
-                enable_agentic_memory=False,
-            )
-            try:
-                ag.model = OpenAIChat(id=model_id)
-            except Exception:
-                pass
-            st.session_state["chat_agent_obj"] = ag
+        manifest = LANCEDB_DIR / MANIFEST_NAME
+        ag = get_chat_agent(
+            lancedb_path=str(LANCEDB_DIR),
+            collection=TABLE_NAME,
+            use_reranker=bool(enable_reranker and cohere_key),
+            rerank_model=rerank_model,
+            model_id=model_id,
+            db_path=str(DATA_DIR / "agent_memory.db"),
+            search_type=SearchType.hybrid if hybrid else SearchType.vector,
+            kb_version=manifest.stat().st_mtime_ns if manifest.exists() else 0,
+        )
+        if "messages" not in st.session_state:
             st.session_state["messages"] = []
-            st.session_state["session_id"] = "st-session-1"
+            st.session_state["session_id"] = f"st-session-{uuid.uuid4().hex}"
 
-        ag = st.session_state["chat_agent_obj"]
         for m in st.session_state["messages"]:
             with st.chat_message(m["role"]):
                 st.markdown(m["content"])
@@ -266,7 +445,7 @@ if uploaded and (process_clicked or st.session_state["processed"]):
                 st.markdown(user_msg)
             with st.chat_message("assistant"):
                 with st.spinner("Thinking..."):
-                    ans, _ = ag.answer(user_msg, user_id="st-user", session_id="st-session-1")
+                    ans, _ = run_async(ag.answer(user_msg, user_id="st-user", session_id=st.session_state["session_id"]))
                     st.markdown(ans)
             st.session_state["messages"].append({"role": "assistant", "content": ans})
 
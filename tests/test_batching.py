@@ -0,0 +1,83 @@
+import asyncio
+
+from utils.batching import (
+    build_batch_prompt,
+    chunked,
+    contiguous_runs,
+    fill_missing,
+    parse_page_outputs,
+    run_page_batch,
+)
+
+
+def test_chunked_yields_start_indices():
+    assert list(chunked(["a", "b", "c", "d", "e"], 2)) == [(0, ["a", "b"]), (2, ["c", "d"]), (4, ["e"])]
+
+
+def test_chunked_accepts_iterators_and_clamps_size():
+    assert list(chunked(iter(["a", "b"]), 0)) == [(0, ["a"]), (1, ["b"])]
+    assert list(chunked([], 3)) == []
+
+
+def test_contiguous_runs_split_on_failed_pages():
+    results = ["a", "b", None, "c", "", "", "d"]
+    assert list(contiguous_runs(results, 5)) == [(5, ["a", "b"]), (8, ["c"]), (11, ["d"])]
+
+
+def test_contiguous_runs_edge_cases():
+    assert list(contiguous_runs([], 1)) == []
+    assert list(contiguous_runs([None, None], 1)) == []
+    assert list(contiguous_runs(["a", "b"], 1)) == [(1, ["a", "b"])]
+
+
+def test_build_batch_prompt_marks_every_page():
+    prompt = build_batch_prompt("Analyze.", ["first", "second"], first_page=4, max_chars=3)
+    assert prompt.startswith("Analyze.")
+    assert "=== PAGE INDEX 0 (report page 4) ===\nfir" in prompt
+    assert "=== PAGE INDEX 1 (report page 5) ===\nsec" in prompt
+    assert "\nsecond" not in prompt  # truncated to max_chars
+    assert "===== OUTPUT <page index> =====" in prompt
+
+
+def test_parse_page_outputs_maps_sections_by_index():
+    reply = "Sure!\n===== OUTPUT 1 =====\nsecond\npage\n\n===== OUTPUT 0 =====\n first \n"
+    assert parse_page_outputs(reply, 2) == ["first", "second\npage"]
+
+
+def test_parse_page_outputs_drops_bad_sections():
+    reply = "===== OUTPUT 0 =====\n\n===== OUTPUT 7 =====\nout of range\n=== OUTPUT 1 ===\nok"
+    assert parse_page_outputs(reply, 3) == [None, "ok", None]
+
+
+def test_parse_page_outputs_without_markers():
+    assert parse_page_outputs("plain text reply", 2) == [None, None]
+
+
+def test_run_page_batch_skips_single_pages_and_swallows_errors():
+    async def never(prompt):
+        raise AssertionError("should not be called")
+
+    async def broken(prompt):
+        raise RuntimeError("boom")
+
+    assert asyncio.run(run_page_batch(never, "x", ["only"], 1)) == [None]
+    assert asyncio.run(run_page_batch(broken, "x", ["a", "b"], 1)) == [None, None]
+
+
+def test_run_page_batch_parses_reply():
+    async def reply(prompt):
+        return "===== OUTPUT 0 =====\nA\n===== OUTPUT 1 =====\nB"
+
+    assert asyncio.run(run_page_batch(reply, "x", ["a", "b"], 1)) == ["A", "B"]
+
+
+def test_fill_missing_retries_only_missing_pages():
+    calls = []
+
+    async def fallback(text, page_number):
+        calls.append(page_number)
+        return text.upper()
+
+    outputs = asyncio.run(fill_missing(["A", None, "C", None], ["a", "b", "c", "d"], 3, fallback))
+    assert outputs == ["A", "B", "C", "D"]
+    assert calls == [4, 6]
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("agno")
+pytest.importorskip("diskcache")
+
+from agno.agent import Agent
+from agno.models.openai import OpenAIChat
+
+from agents._cache import _cache_key
+
+
+def _agent(**kwargs):
+    fields = {"name": "Analyzer", "model": OpenAIChat(id="gpt-4o-mini"), "system_message": "Analyze pages."}
+    fields.update(kwargs)
+    return Agent(**fields)
+
+
+def test_key_is_stable_for_identical_calls():
+    assert _cache_key(_agent(), "page 1") == _cache_key(_agent(), "page 1")
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"name": "Extractor"},
+        {"model": OpenAIChat(id="gpt-4o")},
+        {"model": OpenAIChat(id="gpt-4o-mini", temperature=0.3)},
+        {"system_message": "Analyze pages concisely."},
+        {"instructions": ["Use bullet points."]},
+        {"description": "Page analyzer"},
+    ],
+)
+def test_key_changes_with_anything_that_shapes_the_reply(change):
+    assert _cache_key(_agent(**change), "page 1") != _cache_key(_agent(), "page 1")
+
+
+def test_key_changes_with_prompt():
+    assert _cache_key(_agent(), "page 1") != _cache_key(_agent(), "page 2")
@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("agno")
+pytest.importorskip("openai")
+
+from agents import _clients, _rate_limit
+from agents._clients import SharedOpenAIChat, aclose_clients
+
+
+def test_clients_are_shared_per_loop_and_closed(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    model = SharedOpenAIChat(id="gpt-4o-mini")
+
+    async def use_and_close():
+        client = model.get_async_client()
+        assert model.get_async_client() is client
+        async with _rate_limit.llm_slot():
+            pass
+        await aclose_clients()
+        return client, asyncio.get_running_loop()
+
+    first, loop = asyncio.run(use_and_close())
+    second, _ = asyncio.run(use_and_close())
+
+    assert first is not second
+    assert first.is_closed()
+    assert id(loop) not in _clients._async_clients
+    assert id(loop) not in _rate_limit._semaphores
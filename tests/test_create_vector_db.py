@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("lancedb")
+pytest.importorskip("cohere")
+pytest.importorskip("tiktoken")
+
+from vectordb.create_vector_db import _encoding, _read_chunks
+
+
+@pytest.fixture
+def encoding():
+    try:
+        return _encoding()
+    except Exception:  # encoding files are downloaded on first use
+        pytest.skip("cl100k_base encoding unavailable")
+
+
+def test_read_chunks_slices_overlapping_token_windows(tmp_path, encoding):
+    path = tmp_path / "report.txt"
+    path.write_text(" ".join(f"w{i}" for i in range(40)), encoding="utf-8")
+
+    docs = _read_chunks([(path, "pdf")], chunk_size=10, chunk_overlap=4)
+
+    tokens = encoding.encode(path.read_text(encoding="utf-8"))
+    assert all(len(encoding.encode(doc.content)) <= 10 for doc in docs)
+    assert docs[0].content == encoding.decode(tokens[:10]).strip()
+    assert docs[1].content == encoding.decode(tokens[6:16]).strip()
+    assert docs[-1].content.endswith("w39")
+    assert [doc.meta_data["chunk"] for doc in docs] == list(range(1, len(docs) + 1))
+    assert {(doc.name, doc.meta_data["source"], doc.meta_data["file_name"]) for doc in docs} == {
+        ("report.txt", "pdf", "report.txt")
+    }
+
+
+def test_read_chunks_short_and_empty_files(tmp_path, encoding):
+    short, empty = tmp_path / "short.txt", tmp_path / "empty.txt"
+    short.write_text("Hemoglobin 13.5 g/dL", encoding="utf-8")
+    empty.write_text("", encoding="utf-8")
+
+    docs = _read_chunks([(short, "output"), (empty, "output")], chunk_size=256, chunk_overlap=40)
+
+    assert [doc.content for doc in docs] == ["Hemoglobin 13.5 g/dL"]
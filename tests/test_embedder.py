@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("agno")
+pytest.importorskip("diskcache")
+
+from agno.knowledge.embedder.openai import OpenAIEmbedder
+
+from vectordb.embedder import CachedOpenAIEmbedder
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    seen = []
+
+    def fake_embedding(self, text):
+        seen.append(text)
+        return [] if text == "fail" else [float(len(text))]
+
+    monkeypatch.setattr(OpenAIEmbedder, "get_embedding", fake_embedding)
+    return seen
+
+
+def test_key_depends_on_model_dimensions_and_text():
+    small = CachedOpenAIEmbedder(id="text-embedding-3-small", dimensions=1536)
+    large = CachedOpenAIEmbedder(id="text-embedding-3-large", dimensions=1536)
+    assert small._key("hba1c") == small._key("hba1c")
+    assert small._key("hba1c") != small._key("ldl")
+    assert small._key("hba1c") != large._key("hba1c")
+
+
+def test_repeat_queries_hit_memory(calls):
+    embedder = CachedOpenAIEmbedder()
+    assert embedder.get_embedding("ldl") == [3.0]
+    assert embedder.get_embedding("ldl") == [3.0]
+    assert calls == ["ldl"]
+
+
+def test_lru_evicts_least_recently_used(calls):
+    embedder = CachedOpenAIEmbedder(max_memory_items=2)
+    embedder.get_embedding("a")
+    embedder.get_embedding("b")
+    embedder.get_embedding("a")  # "b" is now the oldest
+    embedder.get_embedding("c")
+    embedder.get_embedding("a")
+    embedder.get_embedding("b")
+    assert calls == ["a", "b", "c", "b"]
+
+
+def test_failures_are_not_cached(calls):
+    embedder = CachedOpenAIEmbedder()
+    assert embedder.get_embedding("fail") == []
+    assert embedder.get_embedding("fail") == []
+    assert calls == ["fail", "fail"]
+
+
+def test_disk_cache_survives_new_instances(calls, tmp_path):
+    CachedOpenAIEmbedder(cache_dir=str(tmp_path)).get_embedding("tsh")
+    assert CachedOpenAIEmbedder(cache_dir=str(tmp_path)).get_embedding("tsh") == [3.0]
+    assert calls == ["tsh"]
@@ -0,0 +1,59 @@
+import pytest
+
+pymupdf = pytest.importorskip("pymupdf")
+
+from utils.pdf_extractor import extract_pages_parallel, extract_text_from_pdf, strip_repeated_lines
+
+
+def _page(n, body):
+    return f"City Lab Diagnostics\nPatient: John Doe\n{body}\nPage {n} of 4\nLab Director: Dr. A"
+
+
+def test_strips_repeated_headers_and_footers():
+    pages = [_page(n, f"Test {n}: 1.{n} mg/dL") for n in range(1, 5)]
+    assert strip_repeated_lines(pages) == [f"Test {n}: 1.{n} mg/dL" for n in range(1, 5)]
+
+
+def test_keeps_repeated_lines_inside_the_body():
+    names = ["Glucose", "Urea", "Creatinine", "Sodium"]
+    pages = [_page(n, f"{name}\n9{n}\nmg/dL\nMethod {n}") for n, name in enumerate(names, 1)]
+    for n, (name, cleaned) in enumerate(zip(names, strip_repeated_lines(pages)), 1):
+        assert cleaned == f"{name}\n9{n}\nmg/dL\nMethod {n}"
+
+
+def test_lines_below_threshold_are_kept():
+    pages = ["Header\nA", "Header\nB", "Other\nC", "Other\nD", "Third\nE"]
+    assert strip_repeated_lines(pages, threshold=0.6) == pages
+
+
+def test_never_blanks_a_page():
+    pages = ["Header\nbody one", "Header\nbody two", "Header"]
+    assert strip_repeated_lines(pages) == ["body one", "body two", "Header"]
+
+
+def test_short_documents_are_untouched():
+    pages = ["Header\nA", "Header\nB"]
+    assert strip_repeated_lines(pages) is pages
+
+
+def _write_pdf(path, n_pages):
+    doc = pymupdf.open()
+    for n in range(1, n_pages + 1):
+        doc.new_page().insert_text((72, 72), f"Report page {n}")
+    doc.new_page()  # blank pages are skipped
+    doc.save(str(path))
+    return path
+
+
+def test_extract_pages_parallel_matches_serial(tmp_path):
+    path = _write_pdf(tmp_path / "report.pdf", 9)
+    expected = [f"Report page {n}" for n in range(1, 10)]
+    assert extract_text_from_pdf(str(path), by_page=True) == expected
+    assert extract_pages_parallel(str(path), workers=3) == expected
+
+
+def test_small_documents_are_read_from_the_buffer(tmp_path):
+    path = _write_pdf(tmp_path / "report.pdf", 2)
+    data = memoryview(path.read_bytes())
+    path.unlink()  # the serial path must not touch the file
+    assert extract_pages_parallel(str(path), workers=3, data=data) == ["Report page 1", "Report page 2"]
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("tiktoken")
+pytest.importorskip("tenacity")
+pytest.importorskip("openai")
+
+from agents import _rate_limit
+from agents._rate_limit import TokenBucket, request_tokens
+
+
+def test_acquire_within_budget_does_not_wait():
+    bucket = TokenBucket(tpm=6000)
+    start = time.monotonic()
+    asyncio.run(bucket.acquire(6000))
+    assert time.monotonic() - start < 0.1
+    assert bucket.tokens < 1
+
+
+def test_acquire_waits_for_refill():
+    bucket = TokenBucket(tpm=600)  # 10 tokens per second
+    bucket.tokens = 0
+    bucket.updated = time.monotonic()
+    start = time.monotonic()
+    asyncio.run(bucket.acquire(3))
+    assert time.monotonic() - start >= 0.25
+
+
+def test_oversized_request_is_clamped_to_capacity():
+    bucket = TokenBucket(tpm=100)
+    asyncio.run(asyncio.wait_for(bucket.acquire(10_000), timeout=1))
+
+
+def test_update_from_headers_only_lowers_the_budget():
+    bucket = TokenBucket(tpm=1000)
+    bucket.update_from_headers({"x-ratelimit-remaining-tokens": "250"})
+    assert bucket.tokens <= 251
+    bucket.update_from_headers({"x-ratelimit-remaining-tokens": "5000"})
+    assert bucket.tokens <= 251
+    bucket.update_from_headers({})  # missing header is ignored
+    assert bucket.tokens <= 252
+
+
+def test_request_tokens_counts_static_text_and_reply(monkeypatch):
+    monkeypatch.setattr(_rate_limit, "estimate_tokens", lambda text, model_id="": len(text.split()))
+    _rate_limit._static_tokens.cache_clear()
+
+    def agent(**kwargs):
+        fields = {"system_message": None, "description": None, "instructions": None}
+        fields.update(kwargs)
+        return SimpleNamespace(model=SimpleNamespace(id="gpt-4o-mini", max_tokens=None), **fields)
+
+    allowance = _rate_limit.OUTPUT_TOKEN_ALLOWANCE
+    assert request_tokens(agent(system_message="one two three"), "four five") == 5 + allowance
+    assert request_tokens(agent(description="a b", instructions=["c", "d e"]), "f") == 6 + allowance
+
+    capped = agent()
+    capped.model.max_tokens = 50
+    assert request_tokens(capped, "x") == 1 + 50
+    _rate_limit._static_tokens.cache_clear()
+
+
+def test_estimate_falls_back_when_encoding_is_unavailable(monkeypatch):
+    def offline(*args, **kwargs):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(_rate_limit.tiktoken, "encoding_for_model", offline)
+    monkeypatch.setattr(_rate_limit.tiktoken, "get_encoding", offline)
+    _rate_limit._encoding.cache_clear()
+    try:
+        assert _rate_limit.estimate_tokens("x" * 40, "unknown-model") == 10
+    finally:
+        _rate_limit._encoding.cache_clear()
+
+
+def test_release_loop_drops_per_loop_state():
+    async def contend():
+        bucket_lock = _rate_limit.BUCKET._lock()
+        async with _rate_limit.llm_slot(), bucket_lock:
+            pass
+        return asyncio.get_running_loop()
+
+    loops = []
+    for _ in range(3):
+        loop = asyncio.new_event_loop()
+        loops.append(loop.run_until_complete(contend()))
+        _rate_limit.release_loop(loop)
+        loop.close()
+
+    assert all(id(loop) not in _rate_limit._semaphores for loop in loops)
+    assert all(id(loop) not in _rate_limit.BUCKET._locks for loop in loops)
+
+
+def test_per_loop_state_is_not_shared_across_loops():
+    async def slot():
+        return _rate_limit.llm_slot()
+
+    first, second = asyncio.new_event_loop(), asyncio.new_event_loop()
+    try:
+        assert first.run_until_complete(slot()) is first.run_until_complete(slot())
+        assert first.run_until_complete(slot()) is not second.run_until_complete(slot())
+    finally:
+        for loop in (first, second):
+            _rate_limit.release_loop(loop)
+            loop.close()
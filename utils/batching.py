@@ -0,0 +1,160 @@
+import re
+import asyncio
+from itertools import islice
+from typing import Awaitable, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+def chunked(items: Iterable[str], size: int) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Split items into consecutive groups.
+
+    Args:
+        items: Items to split (e.g. page texts); may be a lazy iterator.
+        size: Maximum group size.
+
+    Returns:
+        Iterator of (start_index, group) tuples.
+    """
+    size = max(1, size)
+    it = iter(items)
+    start = 0
+    while group := list(islice(it, size)):
+        yield start, group
+        start += len(group)
+
+
+def contiguous_runs(results: Sequence[Optional[str]], first_page: int) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Group consecutive successful results, skipping failed (None/empty) ones.
+
+    Args:
+        results: Per-page results, e.g. extraction outputs.
+        first_page: 1-based report page number of results[0].
+
+    Returns:
+        Iterator of (first_page, texts) tuples, one per unbroken run.
+    """
+    run_start, run = first_page, []
+    for i, text in enumerate(results):
+        if text:
+            if not run:
+                run_start = first_page + i
+            run.append(text)
+        elif run:
+            yield run_start, run
+            run = []
+    if run:
+        yield run_start, run
+
+
+# Line that opens each page's section of a batch reply. Plain text, so the
+# agents' "no markdown or JSON" system prompts hold for batches too.
+_OUTPUT_MARKER = re.compile(r"^[ \t]*=+[ \t]*OUTPUT[ \t]+(\d+)[ \t]*=+[ \t]*$", re.MULTILINE)
+
+
+def build_batch_prompt(instruction: str, pages: Sequence[str], first_page: int, max_chars: int = 15000) -> str:
+    """
+    Pack several report pages into one prompt with a delimited plain-text reply.
+
+    Args:
+        instruction: Task description applied to every page.
+        pages: Page texts in report order.
+        first_page: 1-based report page number of pages[0].
+        max_chars: Per-page truncation limit.
+
+    Returns:
+        str: Prompt with explicit page delimiters and the reply layout.
+    """
+    n = len(pages)
+    header = (
+        f"{instruction}\n\n"
+        f"You will receive {n} pages. Handle each page independently, following your usual output format.\n"
+        f"Reply with {n} sections, one per page, in page order. Start each section with a line containing only "
+        f"\"===== OUTPUT <page index> =====\", with indices 0..{n - 1} matching the PAGE INDEX markers below, "
+        "followed by your plain-text output for that page. Write nothing before the first section."
+    )
+    blocks = [
+        f"=== PAGE INDEX {i} (report page {first_page + i}) ===\n{text[:max_chars]}"
+        for i, text in enumerate(pages)
+    ]
+    return header + "\n\n" + "\n\n".join(blocks)
+
+
+def parse_page_outputs(text: str, expected: int) -> List[Optional[str]]:
+    """
+    Split the reply to a batch prompt into per-page outputs.
+
+    Sections are mapped back by the index in their OUTPUT marker rather
+    than by order; pages that are missing or empty come back as None so
+    callers can retry them one by one.
+
+    Args:
+        text: Raw model response.
+        expected: Number of pages sent in the batch.
+
+    Returns:
+        List[Optional[str]]: One output per page, in page order.
+    """
+    outputs: List[Optional[str]] = [None] * expected
+    # [preamble, index, body, index, body, ...]
+    parts = _OUTPUT_MARKER.split(text)
+    for index, body in zip(parts[1::2], parts[2::2]):
+        index, body = int(index), body.strip()
+        if 0 <= index < expected and body and outputs[index] is None:
+            outputs[index] = body
+
+    return outputs
+
+
+async def run_page_batch(
+    run: Callable[[str], Awaitable[str]],
+    instruction: str,
+    pages: Sequence[str],
+    first_page: int,
+) -> List[Optional[str]]:
+    """
+    Send several pages to the model in one call.
+
+    Args:
+        run: Coroutine function taking a prompt and returning the response text.
+        instruction: Task description applied to every page.
+        pages: Page texts in report order.
+        first_page: 1-based report page number of pages[0].
+
+    Returns:
+        List[Optional[str]]: One output per page; None for pages the call missed.
+    """
+    if len(pages) < 2:
+        return [None] * len(pages)
+    last_page = first_page + len(pages) - 1
+    try:
+        prompt = build_batch_prompt(instruction, pages, first_page)
+        return parse_page_outputs(await run(prompt), len(pages))
+    except Exception as e:
+        print(f"⚠️ Pages {first_page}-{last_page} batch failed: {e}")
+        return [None] * len(pages)
+
+
+async def fill_missing(
+    outputs: List[Optional[str]],
+    pages: Sequence[str],
+    first_page: int,
+    fallback: Callable[[str, int], Awaitable[Optional[str]]],
+) -> List[Optional[str]]:
+    """
+    Re-run pages a batch call dropped through the single-page path.
+
+    Args:
+        outputs: Batch results as returned by run_page_batch (updated in place).
+        pages: Page texts in report order.
+        first_page: 1-based report page number of pages[0].
+        fallback: Single-page coroutine function taking (page_text, page_number).
+
+    Returns:
+        List[Optional[str]]: `outputs` with missing entries filled in.
+    """
+    missing = [i for i, out in enumerate(outputs) if not out]
+    results = await asyncio.gather(*(fallback(pages[i], first_page + i) for i in missing))
+    for i, result in zip(missing, results):
+        outputs[i] = result
+    return outputs
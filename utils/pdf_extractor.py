@@ -1,40 +1,201 @@
+import os
+import re
+import math
 import pymupdf
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Union
+from typing import Iterator, List, Optional, Tuple, Union
 
+# Below this many pages, worker start-up costs more than it saves
+MIN_PARALLEL_PAGES = 8
 
-def extract_text_from_pdf(pdf_path: str, by_page: bool = False) -> Union[str, List[str]]:
+# A file path, or the raw PDF bytes (e.g. an upload buffer already in memory)
+PdfSource = Union[str, Path, bytes, memoryview]
+
+
+def _open_pdf(source: PdfSource) -> pymupdf.Document:
+    if isinstance(source, (bytes, memoryview)):
+        return pymupdf.open(stream=source, filetype="pdf")
+    return pymupdf.open(source)
+
+
+def page_text(page: pymupdf.Page) -> str:
+    """
+    Compact text of one page, rebuilt from PyMuPDF's text blocks.
+
+    Image blocks are dropped and text blocks are ordered top-to-bottom,
+    then left-to-right, so table rows stay together.
+
+    Args:
+        page: PyMuPDF page.
+
+    Returns:
+        str: Block texts joined by newlines, stripped.
+    """
+    blocks = [b for b in page.get_text("blocks") if b[6] == 0]  # 0 = text, 1 = image
+    blocks.sort(key=lambda b: (b[1], b[0]))  # (y0, x0)
+    return "\n".join(b[4].strip() for b in blocks if b[4].strip())
+
+
+def _iter_numbered_pages(pdf_path: PdfSource) -> Iterator[Tuple[int, str]]:
+    with _open_pdf(pdf_path) as doc:
+        for page_num, page in enumerate(doc, 1):
+            text = page_text(page)
+            if text:
+                yield page_num, text
+
+
+def iter_pages(pdf_path: PdfSource) -> Iterator[str]:
+    """
+    Lazily yield the text of each non-empty PDF page.
+
+    Each step parses a page on the calling thread; async callers should
+    consume it through asyncio.to_thread (or use extract_pages_parallel)
+    rather than iterating on the event loop.
+
+    Args:
+        pdf_path: Path to the PDF file, or its raw bytes.
+
+    Returns:
+        Iterator[str]: Page texts in document order, read one page at a time.
+    """
+    for _, text in _iter_numbered_pages(pdf_path):
+        yield text
+
+
+def extract_text_from_pdf(pdf_path: PdfSource, by_page: bool = False) -> Union[str, List[str]]:
     """
     Extract text from a PDF file using PyMuPDF.
 
     Args:
-        pdf_path: Path to the PDF file.
+        pdf_path: Path to the PDF file, or its raw bytes.
         by_page: If True, returns a list of texts per page. If False, returns a single combined string.
 
     Returns:
         str | List[str]: Extracted text from all pages, combined or split per page.
     """
-    doc = pymupdf.open(pdf_path)
-    all_pages = []
-    full_text = ""
-
-    for page_num, page in enumerate(doc, 1):
-        page_text = page.get_text("text").strip()
-        if not page_text:
-            continue
-
-        if by_page:
-            # Keep clean page text for page-wise extraction
-            all_pages.append(page_text)
-        else:
-            # Add page delimiter for readability (combined mode)
-            full_text += (
-                f"\n\n{'=' * 50}\n"
-                f"PAGE {page_num}\n"
-                f"{'=' * 50}\n\n"
-                f"{page_text}"
-            )
-
-    doc.close()
-
-    return all_pages if by_page else full_text
+    if by_page:
+        return list(iter_pages(pdf_path))
+
+    # Add page delimiter for readability (combined mode)
+    return "".join(
+        f"\n\n{'=' * 50}\n"
+        f"PAGE {page_num}\n"
+        f"{'=' * 50}\n\n"
+        f"{text}"
+        for page_num, text in _iter_numbered_pages(pdf_path)
+    )
+
+
+def _extract_range(pdf_path: PdfSource, start: int, stop: int) -> List[str]:
+    # Runs in a worker process: each worker opens its own handle
+    with _open_pdf(pdf_path) as doc:
+        texts = (page_text(doc[i]) for i in range(start, stop))
+        return [text for text in texts if text]
+
+
+def extract_pages_parallel(
+    pdf_path: PdfSource,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    data: Optional[Union[bytes, memoryview]] = None,
+) -> List[str]:
+    """
+    Extract non-empty page texts using several processes.
+
+    The document is split into one contiguous page range per worker, so
+    each process opens the file once. Small documents are read serially.
+
+    Args:
+        pdf_path: Path to the PDF file, or its raw bytes.
+        workers: Number of page ranges / processes (defaults to CPU count).
+        executor: Existing process pool to reuse; a temporary one is created otherwise.
+        data: In-memory copy of the file at pdf_path (e.g. an upload buffer).
+            Used for the page count and the serial path; workers only ever
+            receive the path, so the PDF is not pickled into each task.
+
+    Returns:
+        List[str]: Page texts in document order, same as extract_text_from_pdf(by_page=True).
+    """
+    workers = workers or os.cpu_count() or 1
+    local = pdf_path if data is None else data
+    with _open_pdf(local) as doc:
+        page_count = doc.page_count
+
+    if workers < 2 or page_count < MIN_PARALLEL_PAGES:
+        return list(iter_pages(local))
+
+    step = math.ceil(page_count / workers)
+    starts = list(range(0, page_count, step))
+    stops = [min(start + step, page_count) for start in starts]
+    paths = [pdf_path] * len(starts)
+
+    if executor is not None:
+        ranges = executor.map(_extract_range, paths, starts, stops)
+        return [text for texts in ranges for text in texts]
+    with ProcessPoolExecutor(max_workers=len(starts)) as pool:
+        ranges = pool.map(_extract_range, paths, starts, stops)
+        return [text for texts in ranges for text in texts]
+
+
+def _line_key(line: str) -> str:
+    # "Page 2 of 5" and "Page 3 of 5" should count as the same header line.
+    # Only page-numbering lines are normalized: "Hemoglobin 13.5 g/dL" and
+    # "Hemoglobin 14.1 g/dL" at the same spot on two pages are results.
+    line = line.strip()
+    return re.sub(r"\d+", "#", line) if re.search(r"\bpage\b", line, re.IGNORECASE) else line
+
+
+def _edge_run(lines: List[str], boilerplate: set) -> int:
+    """Length of the leading run of lines whose (offset, key) is boilerplate."""
+    for i, line in enumerate(lines):
+        if (i, _line_key(line)) not in boilerplate:
+            return i
+    return len(lines)
+
+
+def _boilerplate(split_pages: List[List[str]], min_pages: int) -> set:
+    # Keyed on position as well as text, so a unit like "mg/dL" that happens
+    # to sit next to the footer on some pages is not mistaken for one.
+    counts = Counter(
+        (i, _line_key(line)) for lines in split_pages for i, line in enumerate(lines)
+    )
+    return {pair for pair, n in counts.items() if n >= min_pages}
+
+
+def strip_repeated_lines(pages: List[str], threshold: float = 0.6) -> List[str]:
+    """
+    Remove header/footer boilerplate that repeats across report pages.
+
+    A line counts as boilerplate when it appears at the same offset from
+    the top (or bottom) on at least `threshold` of the pages. Only the
+    contiguous runs of such lines at each page edge are dropped, so units
+    or values that recur inside result tables are kept.
+
+    Args:
+        pages: Page texts as returned by extract_text_from_pdf(by_page=True).
+        threshold: Fraction of pages a line must appear on to be stripped.
+
+    Returns:
+        List[str]: Page texts with repeated headers/footers removed.
+    """
+    if len(pages) < 3:
+        return pages
+
+    split_pages = [[l for l in page.splitlines() if l.strip()] for page in pages]
+    min_pages = math.ceil(threshold * len(pages))
+    headers = _boilerplate(split_pages, min_pages)
+    footers = _boilerplate([lines[::-1] for lines in split_pages], min_pages)
+    if not headers and not footers:
+        return pages
+
+    cleaned = []
+    for lines, original in zip(split_pages, pages):
+        head = _edge_run(lines, headers)
+        tail = _edge_run(lines[head:][::-1], footers)
+        body = "\n".join(lines[head:len(lines) - tail]).strip()
+        # Never blank out a page entirely
+        cleaned.append(body or original)
+
+    return cleaned
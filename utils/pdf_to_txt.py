@@ -1,6 +1,10 @@
 import os
+import sys
 import fitz  # PyMuPDF
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.pdf_extractor import page_text
+
 def convert_all_pdfs_to_txt():
     """
     Convert all PDF files in ../data/knowledge_base_pdfs to text files
@@ -34,7 +38,7 @@ def convert_all_pdfs_to_txt():
             text = ""
             for page_num, page in enumerate(doc, start=1):
                 text += f"\n--- Page {page_num} ---\n"
-                text += page.get_text("text")
+                text += page_text(page)
             doc.close()
 
             with open(output_path, "w", encoding="utf-8") as f:
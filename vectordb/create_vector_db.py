@@ -1,30 +1,45 @@
 import os
+import json
+import math
 import shutil
+import asyncio
+import hashlib
 import pathlib
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
 
+import tiktoken
 from dotenv import load_dotenv
 from agno.knowledge.knowledge import Knowledge
 from agno.knowledge.embedder.openai import OpenAIEmbedder
 from agno.knowledge.reranker.cohere import CohereReranker
 from agno.vectordb.lancedb import LanceDb
 from agno.vectordb.search import SearchType
-from agno.knowledge.reader.text_reader import TextReader
+from agno.knowledge.document import Document
 
 load_dotenv()
 
+VECTOR_COLUMN = "vector"  # column Agno's LanceDb writes embeddings to
+FTS_COLUMN = "payload"  # JSON text column Agno's hybrid search runs BM25 over
+# {"chunking": "<encoding>:<size>:<overlap>", "files": {relative path: {"stamp": "mtime_ns:size", "source": ...}}}
+MANIFEST_NAME = "manifest.json"
+
+# Tokenizer of text-embedding-3-small, so chunk sizes are what the embedder sees
+ENCODING_NAME = "cl100k_base"
+
 
 def create_vectordb_from_pdfs_and_outputs(
     base_dir: Optional[str | pathlib.Path] = None,
     pdfs_subdir: str = "data/knowledge_base/pdfs",
     outputs_subdir: str = "data/knowledge_base/outputs",
     lancedb_subdir: str = "data/lancedb",
-    chunk_size: int = 1000,
-    chunk_overlap: int = 150,
-    recreate: bool = True,
+    chunk_size: int = 256,  # tokens (~1000 characters of report text)
+    chunk_overlap: int = 40,  # tokens
+    recreate: bool = False,
     table_name: str = "medguide_collection",
     search_type: SearchType = SearchType.vector,  # can be vector / keyword / hybrid
     use_reranker: bool = True,
+    rerank_model: str = "rerank-english-v3.0",  # reports are English; lighter than multilingual
 ) -> Knowledge:
     """
     Build a persistent LanceDB knowledge base from .txt files in:
@@ -34,8 +49,14 @@ def create_vectordb_from_pdfs_and_outputs(
     Uses:
       - OpenAI embeddings (text-embedding-3-small)
       - Cohere reranker (optional)
-      - Agno TextReader for chunking
+      - tiktoken (cl100k_base) for token-window chunking
       - LanceDB for storage and retrieval
+
+    The build is incremental: a manifest in the LanceDB directory records
+    each ingested file's mtime and size, and only new or modified files are
+    re-chunked and embedded; chunks of changed or deleted files are dropped
+    first. Changing the chunking settings, or passing recreate=True,
+    rebuilds from scratch.
     """
 
     # -------- Paths setup --------
@@ -44,14 +65,20 @@ def create_vectordb_from_pdfs_and_outputs(
     outputs_dir = base_dir / outputs_subdir
     lancedb_dir = base_dir / lancedb_subdir
 
-    if recreate and lancedb_dir.exists():
+    manifest_path = lancedb_dir / MANIFEST_NAME
+    chunking = f"{ENCODING_NAME}:{chunk_size}:{chunk_overlap}"
+    manifest = _load_manifest(manifest_path)
+    # Without a manifest there is no telling which files the table holds, and
+    # chunks cut with other settings must not mix with new ones
+    if lancedb_dir.exists() and (recreate or manifest.get("chunking") != chunking):
         print(f"🧹 Removing old LanceDB directory at: {lancedb_dir}")
         shutil.rmtree(lancedb_dir)
+        manifest = {}
     lancedb_dir.mkdir(parents=True, exist_ok=True)
 
     # -------- Collect .txt files --------
-    pdf_txt_files = [f for f in pdfs_dir.glob("*.txt") if f.is_file()]
-    output_txt_files = [f for f in outputs_dir.glob("*.txt") if f.is_file()]
+    pdf_txt_files = _txt_files(pdfs_dir)
+    output_txt_files = _txt_files(outputs_dir)
 
     if not pdf_txt_files and not output_txt_files:
         raise FileNotFoundError("❌ No .txt files found in pdfs/ or outputs/")
@@ -62,43 +89,207 @@ def create_vectordb_from_pdfs_and_outputs(
     vector_db = LanceDb(
         uri=str(lancedb_dir),
         table_name=table_name,
-        embedder=OpenAIEmbedder(id="text-embedding-3-small"),
-        search_type=search_type.hybrid,
-        reranker=CohereReranker(model="rerank-multilingual-v3.0") if use_reranker else None,
+        # One embeddings request per 256 chunks instead of one per chunk
+        embedder=OpenAIEmbedder(id="text-embedding-3-small", enable_batch=True, batch_size=256),
+        search_type=search_type,
+        reranker=CohereReranker(model=rerank_model) if use_reranker else None,
+        use_tantivy=False,  # native FTS index, persisted and listed with the table
     )
 
     # -------- Create Knowledge base --------
     knowledge = Knowledge(vector_db=vector_db)
 
-    # -------- Reader for chunking --------
-    reader = TextReader(
-        chunk=True,
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-    )
+    # -------- Ingest new / modified files (with metadata) --------
+    files = [(path, "pdf") for path in pdf_txt_files] + [(path, "output") for path in output_txt_files]
+    previous = manifest.get("files", {}) if vector_db.get_count() > 0 else {}
+    current = {
+        _manifest_key(path, base_dir): {"stamp": _file_stamp(path), "source": source}
+        for path, source in files
+    }
+
+    changed = [
+        (path, source) for path, source in files
+        if previous.get(_manifest_key(path, base_dir)) != current[_manifest_key(path, base_dir)]
+    ]
+    stale = {
+        (entry["source"], pathlib.PurePosixPath(key).name)
+        for key, entry in previous.items()
+        if entry != current.get(key)
+    }
+    if stale:
+        _delete_file_chunks(vector_db, stale)
+
+    print(f"🧠 Adding {len(changed)} new or modified files to LanceDB vector store...")
 
-    # -------- Ingest files (with metadata) --------
-    print("🧠 Adding documents to LanceDB vector store...")
-
-    count = 0
-    for path in pdf_txt_files:
-        knowledge.add_content(
-            path=str(path),
-            reader=reader,
-            metadata={"source": "pdf", "file_name": path.name},
-        )
-        count += 1
-
-    for path in output_txt_files:
-        knowledge.add_content(
-            path=str(path),
-            reader=reader,
-            metadata={"source": "output", "file_name": path.name},
-        )
-        count += 1
+    # Chunk every file up front so all chunks share one batched embedding
+    # pass and a single LanceDB write, instead of one round per file
+    if changed:
+        documents = _read_chunks(changed, chunk_size, chunk_overlap)
+        batch_hash = hashlib.sha256("\n".join(str(path) for path, _ in changed).encode()).hexdigest()
+        asyncio.run(vector_db.async_insert(batch_hash, documents))
+        if previous:
+            vector_db.table.optimize()  # fold the new rows into existing indexes
+    manifest_path.write_text(json.dumps({"chunking": chunking, "files": current}, indent=2), encoding="utf-8")
+    count = len(changed)
 
     print(f"✅ Ingested {count} files into LanceDB table '{table_name}' at {lancedb_dir}")
+
+    # -------- Indexes: ANN for vector search, BM25 for hybrid retrieval --------
+    ensure_ann_index(vector_db)
+    ensure_fts_index(vector_db)
     print("✅ Vector database created successfully (LanceDB).")
 
     return knowledge
 
+
+def _txt_files(directory: pathlib.Path) -> List[pathlib.Path]:
+    # scandir hands back cached d_type, so is_file() costs no extra stat
+    try:
+        with os.scandir(directory) as entries:
+            return [pathlib.Path(e.path) for e in entries if e.name.endswith(".txt") and e.is_file()]
+    except FileNotFoundError:
+        return []
+
+
+def _manifest_key(path: pathlib.Path, base_dir: pathlib.Path) -> str:
+    return path.relative_to(base_dir).as_posix()
+
+
+def _file_stamp(path: pathlib.Path) -> str:
+    stat = path.stat()
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _load_manifest(path: pathlib.Path) -> Dict[str, dict]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _delete_file_chunks(vector_db: LanceDb, files: Set[Tuple[str, str]]) -> None:
+    """Drop every chunk whose (source, file_name) metadata is in `files`, in one delete."""
+    table = vector_db.table
+    n_rows = table.count_rows() if table is not None else 0
+    if not n_rows:
+        return
+
+    rows = table.search().select(["id", FTS_COLUMN]).limit(n_rows).to_pandas()
+    ids = []
+    for row_id, payload in zip(rows["id"], rows[FTS_COLUMN]):
+        meta = json.loads(payload).get("meta_data") or {}
+        if (meta.get("source"), meta.get("file_name")) in files:
+            ids.append(row_id)
+
+    if ids:
+        table.delete("id IN (" + ", ".join(f"'{row_id}'" for row_id in ids) + ")")
+        print(f"🧹 Removed {len(ids)} outdated chunks from {len(files)} changed files")
+
+
+@lru_cache(maxsize=None)
+def _encoding() -> tiktoken.Encoding:
+    # Loaded on first use: tiktoken downloads the encoding file, and the
+    # apps import this module just for MANIFEST_NAME
+    return tiktoken.get_encoding(ENCODING_NAME)
+
+
+def _read_chunks(files: List[tuple[pathlib.Path, str]], chunk_size: int, chunk_overlap: int) -> List[Document]:
+    """
+    Split (path, source) pairs into overlapping token windows.
+
+    Each file is encoded once with the shared tokenizer and sliced with a
+    stride of chunk_size - chunk_overlap, so chunks never exceed the
+    embedder's view of chunk_size and no text is re-tokenized per chunk.
+    """
+    encoding = _encoding()
+    stride = max(1, chunk_size - chunk_overlap)
+    documents = []
+    for path, source in files:
+        tokens = encoding.encode(path.read_text(encoding="utf-8", errors="ignore"))
+        for number, start in enumerate(range(0, len(tokens), stride), start=1):
+            content = encoding.decode(tokens[start:start + chunk_size]).strip()
+            if not content:
+                continue
+            documents.append(Document(
+                name=path.name,
+                content=content,
+                meta_data={"source": source, "file_name": path.name, "chunk": number},
+            ))
+            if start + chunk_size >= len(tokens):
+                break
+    return documents
+
+
+def ensure_ann_index(
+    vector_db: LanceDb,
+    index_type: str = "IVF_PQ",
+    num_partitions: Optional[int] = None,
+    num_sub_vectors: int = 96,
+    min_rows: int = 10_000,
+) -> bool:
+    """
+    Build an ANN index on the LanceDB vector column so searches stop
+    brute-force scanning the whole table. Safe to call repeatedly.
+
+    Args:
+        vector_db: Agno LanceDb wrapper whose table should be indexed.
+        index_type: LanceDB index type ("IVF_PQ" or "IVF_HNSW_SQ").
+        num_partitions: Number of IVF partitions (default: sqrt(rows), capped at 256).
+        num_sub_vectors: PQ sub-vectors (ignored for HNSW_SQ); must divide the embedding size.
+        min_rows: Below this many rows the index is skipped and flat search is used.
+
+    Returns:
+        bool: True if an index exists after the call.
+    """
+    table = vector_db.table
+    if table is None:
+        return False
+
+    if any(VECTOR_COLUMN in idx.columns for idx in table.list_indices()):
+        return True
+
+    n_rows = table.count_rows()
+    if n_rows < min_rows:
+        # Flat search over a small corpus is already fast and exact
+        print(f"ℹ️ Skipping ANN index: only {n_rows} rows in '{vector_db.table_name}'")
+        return False
+
+    params = {"num_partitions": num_partitions or min(256, int(math.sqrt(n_rows)))}
+    if index_type == "IVF_PQ":
+        params["num_sub_vectors"] = num_sub_vectors
+
+    # Agno queries without a metric, i.e. LanceDB's default L2; OpenAI
+    # embeddings are unit-length, so L2 ranks exactly like cosine.
+    table.create_index(
+        metric="l2",
+        vector_column_name=VECTOR_COLUMN,
+        index_type=index_type,
+        **params,
+    )
+    print(f"✅ Built {index_type} index on '{vector_db.table_name}' ({n_rows} rows)")
+    return True
+
+
+def ensure_fts_index(vector_db: LanceDb) -> bool:
+    """
+    Build LanceDB's BM25 full-text index over the payload column once.
+
+    Agno otherwise (re)creates it on the first hybrid search of every
+    LanceDb instance. Marks the wrapper so it skips that rebuild.
+
+    Args:
+        vector_db: Agno LanceDb wrapper whose table should be indexed.
+
+    Returns:
+        bool: True if the table has a full-text index after the call.
+    """
+    table = vector_db.table
+    if table is None or table.count_rows() == 0:
+        return False
+
+    if not any(FTS_COLUMN in idx.columns for idx in table.list_indices()):
+        table.create_fts_index(FTS_COLUMN, use_tantivy=False, replace=True)
+        print(f"✅ Built full-text index on '{vector_db.table_name}.{FTS_COLUMN}'")
+
+    vector_db.fts_index_exists = True
+    return True
@@ -0,0 +1,64 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import diskcache
+from agno.knowledge.embedder.openai import OpenAIEmbedder
+
+
+@dataclass
+class CachedOpenAIEmbedder(OpenAIEmbedder):
+    """
+    OpenAIEmbedder that memoizes query embeddings.
+
+    LanceDb embeds every search query through get_embedding, so repeated
+    chat questions pay the OpenAI round trip only once. Hits are served
+    from an in-memory LRU, backed by an optional diskcache directory so
+    they survive restarts. Document embedding paths are left untouched.
+    """
+
+    cache_dir: Optional[str] = None
+    max_memory_items: int = 1024
+    _memory: "OrderedDict[str, List[float]]" = field(default_factory=OrderedDict, init=False, repr=False)
+    _disk: Optional[diskcache.Cache] = field(default=None, init=False, repr=False)
+    # Searches run via asyncio.to_thread, so the LRU is lock-guarded
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self):
+        super().__post_init__()
+        if self.cache_dir:
+            self._disk = diskcache.Cache(self.cache_dir)
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return f"{self.id}:{self.dimensions}:{digest}"
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._memory[key] = embedding
+            self._memory.move_to_end(key)
+            if len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def get_embedding(self, text: str) -> List[float]:
+        key = self._key(text)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        if self._disk is not None:
+            cached = self._disk.get(key)
+            if cached is not None:
+                self._remember(key, cached)
+                return cached
+
+        embedding = super().get_embedding(text)
+        if embedding:  # failures come back as [] and must not be cached
+            self._remember(key, embedding)
+            if self._disk is not None:
+                self._disk.set(key, embedding)
+        return embedding